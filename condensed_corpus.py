@@ -145,11 +145,7 @@ class CondensedCorpus:
             return self.get_result_by_rowid(key)
 
     def insert(self, hash_, tokens):
-        dimensions = 2 + len(tokens)
-        array = np.empty(dimensions, dtype=np.uint8)
-
-        for t, index in enumerate(vectorize_tokens(tokens)):
-            array[t] = index
+        array = vectorize_tokens(tokens).astype(np.uint8)
 
         filelike = io.BytesIO()
         np.save(filelike, array)
@@ -16,12 +16,12 @@
 # limitations under the License.
 
 import argparse
+import atexit
 import io
 import json
 import operator
 import subprocess
 import sys
-import tempfile
 
 from pathlib import Path
 from itertools import islice
@@ -29,28 +29,48 @@ from collections import namedtuple
 from functools import total_ordering
 
 import numpy as np
-from keras.models import model_from_json
+from keras.models import Sequential, model_from_json
+from keras.layers import Embedding
 from blessings import Terminal
 
-from unvocabularize import unvocabularize
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+from unvocabularize import ID2TEXT, unvocabularize
 from vectorize_tokens import vectorize_tokens
 from corpus import Token
 from vocabulary import vocabulary
-from training_utils import Sentences, one_hot_batch
+from training_utils import at_least, sliding_windows
 
 
 THIS_DIRECTORY = Path(__file__).parent
 TOKENIZE_JS_BIN = ('node', str(THIS_DIRECTORY / 'tokenize-js'))
-CHECK_SYNTAX_BIN = (*TOKENIZE_JS_BIN, '--check-syntax')
+TOKENIZE_SERVER_BIN = (*TOKENIZE_JS_BIN, '--server')
 
 SENTENCE_LENGTH = 20
 PREFIX_LENGTH = SENTENCE_LENGTH - 1
 
+# How many sentences are sent to the model in one go.
+BATCH_SIZE = 1024
+
+# Contexts where the forwards model guesses the actual token with at least
+# this probability are assumed to be fine when suggesting fixes.
+CONFIDENCE_THRESHOLD = 0.9
+
+# The tokens made from token ids so far.
+_ID2TOKEN = {}
+
 
 Common = namedtuple('Common',
                     'forwards_model backwards_model file_vector tokens '
                     'filename')
 
+Scores = namedtuple('Scores',
+                    'means agreements forwards_predictions '
+                    'backwards_predictions')
+
 
 @total_ordering
 class Agreement(namedtuple('BaseAgreement', 'probability index')):
@@ -77,7 +97,7 @@ class Model:
     >>> model = Model.from_filenames(architecture='model-architecture.json',
     ...                              weights='javascript-tiny.5.h5')
     >>> comma = vocabulary.to_index(',')
-    >>> answer = model.predict([comma] * 19)
+    >>> answer = model.predict([comma] * SENTENCE_LENGTH)
     >>> len(answer) == len(vocabulary)
     True
     >>> answer[comma] > 0.5
@@ -93,11 +113,44 @@ class Model:
 
     def predict(self, vector):
         """
-        TODO: Create predict() for entire file as a batch?
+        Predicts the next token for a single sentence of SENTENCE_LENGTH
+        tokens.
         """
-        x, y = one_hot_batch([(vector, 0)], batch_size=1,
-                             sentence_length=SENTENCE_LENGTH)
-        return self.model.predict(x, batch_size=1)[0]
+        if len(vector) != SENTENCE_LENGTH:
+            raise ValueError("Sentence must have %d tokens, not %d" %
+                             (SENTENCE_LENGTH, len(vector)))
+        return self.predict_batch([vector])[0]
+
+    def predict_batch(self, sentences):
+        """
+        Predicts every given sentence with a single call to the model.
+        Returns a matrix with one row of predictions per sentence.
+        """
+        x = np.asarray(sentences, dtype=np.int32)
+        x = x.reshape((-1, SENTENCE_LENGTH))
+        if len(x) == 0:
+            return np.empty((0, len(vocabulary)), dtype=np.float32)
+        return self.model.predict(x, batch_size=BATCH_SIZE, verbose=0)
+
+    def predict_file(self, file_vector):
+        """
+        Predicts every sentence of the file, in this model's direction.
+        """
+        sentences, _ = self.sentences(file_vector)
+        return self.predict_batch(sentences)
+
+    def sentences(self, file_vector):
+        """
+        Returns every sentence of the file in this model's direction, one per
+        row, along with the token each sentence should predict.
+        """
+        file_vector = np.asarray(file_vector, dtype=np.int32)
+        windows = sliding_windows(file_vector, SENTENCE_LENGTH)
+        if self.backwards:
+            # Backwards sentences start one token after the one they predict.
+            return windows[1:], file_vector[:-SENTENCE_LENGTH]
+        else:
+            return windows[:-1], file_vector[SENTENCE_LENGTH:]
 
     @classmethod
     def from_filenames(cls, *, architecture=None, weights=None, **kwargs):
@@ -105,14 +158,58 @@ class Model:
             model = model_from_json(archfile.read())
         model.load_weights(weights)
 
-        return cls(model, **kwargs)
+        return cls(with_index_input(model), **kwargs)
+
+    @classmethod
+    def from_onnx(cls, filename, **kwargs):
+        """
+        Loads a model that was exported to ONNX, to be run by ONNX Runtime.
+        """
+        return cls(OnnxModel.from_filename(filename), **kwargs)
+
 
+class OnnxModel:
+    """
+    Runs an ONNX export of a model through ONNX Runtime on the CPU, with
+    the same predict() as a Keras model.
 
-def synthetic_file(text):
-    file_obj = tempfile.TemporaryFile('w+t', encoding='utf-8')
-    file_obj.write(text)
-    file_obj.seek(0)
-    return file_obj
+    The export must take int32 token indices of shape (N, SENTENCE_LENGTH),
+    like the models returned by with_index_input(). Its weights may be
+    quantized with onnxruntime.quantization.quantize_dynamic(); whether
+    INT8 is actually faster than FP32 depends on the CPU, so measure both.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.session.run(None, {self.input_name: x})[0]
+
+    @classmethod
+    def from_filename(cls, filename):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is needed to run ONNX models")
+        session = onnxruntime.InferenceSession(
+            filename, providers=['CPUExecutionProvider'])
+        return cls(session)
+
+
+def with_index_input(model):
+    """
+    Prepends a frozen, identity Embedding layer to a model that was trained
+    on one-hot sentences, so that it can be fed token indices directly. The
+    one-hot expansion then happens inside the backend as a lookup, instead
+    of being built in NumPy and copied over.
+    """
+    if isinstance(model.layers[0], Embedding):
+        return model
+
+    vocab_size = len(vocabulary)
+    one_hot = Embedding(vocab_size, vocab_size,
+                        input_length=SENTENCE_LENGTH,
+                        weights=[np.identity(vocab_size, dtype=np.float32)],
+                        trainable=False)
+    return Sequential([one_hot] + model.layers)
 
 
 def check_syntax(source):
@@ -122,33 +219,146 @@ def check_syntax(source):
     >>> check_syntax('function name() }')
     False
     """
-    with synthetic_file(source) as source_file:
-        status = subprocess.run(CHECK_SYNTAX_BIN, stdin=source_file)
-    return status.returncode == 0
+    return TokenizerProcess.instance().check_syntax(source)
 
 
 def tokenize_file(file_obj):
     """
-    >>> with synthetic_file('$("hello");') as f:
-    ...     tokens = tokenize_file(f)
+    >>> tokens = tokenize_file(io.StringIO('$("hello");'))
+    >>> len(tokens)
+    5
+    """
+    return tokenize_source(file_obj.read())
+
+
+def tokenize_source(source):
+    """
+    >>> tokens = tokenize_source('$("hello");')
     >>> len(tokens)
     5
     >>> isinstance(tokens[0], Token)
     True
     """
-    status = subprocess.run(TOKENIZE_JS_BIN,
-                            check=True,
-                            stdin=file_obj,
-                            stdout=subprocess.PIPE)
-    return [
-        Token.from_json(raw_token)
-        for raw_token in json.loads(status.stdout.decode('UTF-8'))
-    ]
+    raw_tokens = TokenizerProcess.instance().tokenize(source)
+    return [Token.from_json(raw_token) for raw_token in raw_tokens]
+
+
+class TokenizerProcess:
+    """
+    A long-lived tokenize-js process, so that Node.js is started once per
+    run rather than once per tokenized or syntax checked file. The process
+    is restarted if it dies, and stopped when Python exits.
+    """
+    _instance = None
+
+    def __init__(self):
+        self._process = None
+        atexit.register(self.close)
 
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def tokenize(self, source):
+        """
+        Returns the raw JSON tokens of the given source code.
+        """
+        return self._request(b'tokenize', source)
+
+    def check_syntax(self, source):
+        """
+        Returns whether the given source code is syntactically valid.
+        """
+        return self._request(b'check', source)
+
+    def _request(self, command, source):
+        process = self._start()
+        data = source.encode('UTF-8')
+        try:
+            process.stdin.write(b'%s %d\n' % (command, len(data)) + data)
+            process.stdin.flush()
+            header = process.stdout.readline()
+        except OSError:
+            # The process died before or while it was sent the request.
+            header = b''
+
+        if not header:
+            self.close()
+            raise subprocess.CalledProcessError(process.returncode,
+                                                TOKENIZE_SERVER_BIN)
+        response = process.stdout.read(int(header))
+        return json.loads(response.decode('UTF-8'))
+
+    def close(self):
+        """
+        Stops the tokenize-js process, if there is one, and waits for it.
+        """
+        process, self._process = self._process, None
+        if process is None:
+            return
+
+        for pipe in (process.stdin, process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        process.wait()
+
+    def _start(self):
+        if self._process is None:
+            self._process = subprocess.Popen(TOKENIZE_SERVER_BIN,
+                                             stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE)
+        return self._process
+
+
+def top_k_rows(predictions, k=5):
+    """
+    Returns the ids of the k most likely tokens of every row of predictions,
+    most likely first. Tied tokens are chosen and listed by id, as if each
+    row had been fully sorted by probability and then by id.
+
+    >>> predictions = np.array([[0.125, 0.5, 0.375], [0.25, 0.5, 0.25]])
+    >>> top_k_rows(predictions, k=2).tolist()
+    [[1, 2], [1, 0]]
+    """
+    n_rows, vocab_size = predictions.shape
+    k = min(k, vocab_size)
+
+    # The k-th highest probability of each row.
+    kth = -np.partition(-predictions, k - 1, axis=1)[:, k - 1:k]
+    above = predictions > kth
+    tied = predictions == kth
+    # Fill the places left over with the tied tokens of the lowest ids.
+    n_left = k - above.sum(axis=1, keepdims=True)
+    chosen = above | (tied & (np.cumsum(tied, axis=1) <= n_left))
+    best = np.nonzero(chosen)[1].reshape((n_rows, k))
+
+    rows = np.arange(n_rows)[:, np.newaxis]
+    order = np.argsort(-predictions[rows, best], axis=1, kind='mergesort')
+    return best[rows, order]
+
+
+def rank_of(token_ids, predictions):
+    """
+    Returns the 1-indexed position that each row's token would have if the
+    row were sorted by probability, ties broken by id, without sorting.
+
+    >>> predictions = np.array([[0.125, 0.5, 0.25, 0.125]] * 4)
+    >>> rank_of(np.arange(4), predictions).tolist()
+    [3, 1, 2, 4]
+    """
+    token_ids = np.asarray(token_ids)
+    rows = np.arange(len(predictions))
+    probabilities = predictions[rows, token_ids][:, np.newaxis]
+    ids = np.arange(predictions.shape[1])
 
-def rank(predictions):
-    return list(sorted(enumerate(predictions),
-                       key=lambda t: t[1], reverse=True))
+    more_likely = predictions > probabilities
+    tied_before = ((predictions == probabilities) &
+                   (ids[np.newaxis, :] < token_ids[:, np.newaxis]))
+    return more_likely.sum(axis=1) + tied_before.sum(axis=1) + 1
 
 
 def mean_reciprocal_rank(ranks):
@@ -158,37 +368,152 @@ def mean_reciprocal_rank(ranks):
 def common_args(*, filename=None,
                 architecture=None,
                 weights_forwards=None, weights_backwards=None,
+                onnx_forwards=None, onnx_backwards=None,
                 **kwargs):
-    assert architecture.exists()
-    assert weights_forwards.exists()
-
     with open(str(filename), 'rt', encoding='UTF-8') as script:
         tokens = tokenize_file(script)
 
     file_vector = vectorize_tokens(tokens)
-    forwards_model = Model.from_filenames(architecture=str(architecture),
-                                          weights=str(weights_forwards),
-                                          backwards=False)
-    backwards_model = Model.from_filenames(architecture=str(architecture),
-                                           weights=str(weights_backwards),
-                                           backwards=True)
+    forwards_model = load_model(architecture, weights_forwards,
+                                onnx_forwards, backwards=False)
+    backwards_model = load_model(architecture, weights_backwards,
+                                 onnx_backwards, backwards=True)
 
     return Common(forwards_model, backwards_model, file_vector,
                   tokens, filename)
 
 
+def load_model(architecture, weights, onnx_model=None, *, backwards=False):
+    """
+    Loads the ONNX export of the model if one is given; otherwise, loads the
+    Keras model.
+    """
+    if onnx_model is not None:
+        assert onnx_model.exists()
+        return Model.from_onnx(str(onnx_model), backwards=backwards)
+
+    assert architecture.exists()
+    assert weights.exists()
+    return Model.from_filenames(architecture=str(architecture),
+                                weights=str(weights),
+                                backwards=backwards)
+
+
 def top_5(*, forwards=None, **kwargs):
     common = common_args(**kwargs)
     model = common.forwards_model if forwards else common.backwards_model
     print_top_5(model, common.file_vector, common.tokens)
 
 
+def split_contexts(file_vector):
+    """
+    Returns the prefixes, suffixes, and actual tokens of every token with a
+    full sentence on either side, as aligned arrays.
+
+    >>> prefixes, suffixes, actuals = split_contexts(range(45))
+    >>> len(prefixes), len(suffixes), len(actuals)
+    (5, 5, 5)
+    >>> int(prefixes[0, -1]), int(actuals[0]), int(suffixes[0, 0])
+    (19, 20, 21)
+    """
+    file_vector = np.asarray(file_vector, dtype=np.int32)
+    windows = sliding_windows(file_vector, SENTENCE_LENGTH)
+    prefixes = windows[:-(SENTENCE_LENGTH + 1)]
+    suffixes = windows[SENTENCE_LENGTH + 1:]
+    actuals = file_vector[SENTENCE_LENGTH:-SENTENCE_LENGTH]
+    return prefixes, suffixes, actuals
+
+
+def predict_prefixes(common):
+    """
+    Predicts every context of the file with the forwards model. Row i
+    predicts the token at file_vector[SENTENCE_LENGTH + i], like the rows
+    of split_contexts().
+    """
+    n_contexts = at_least(0, len(common.file_vector) - 2 * SENTENCE_LENGTH)
+    prefix_preds = common.forwards_model.predict_file(common.file_vector)
+    return fix_zeros(prefix_preds[:n_contexts])
+
+
+def predict_suffixes(common, contexts=None):
+    """
+    Predicts every context of the file with the backwards model, aligned
+    like predict_prefixes(). If the indices of some contexts are given, only
+    those are predicted, in that order.
+    """
+    if contexts is None:
+        suffix_preds = common.backwards_model.predict_file(common.file_vector)
+        return fix_zeros(suffix_preds[SENTENCE_LENGTH:])
+
+    _, suffixes, _ = split_contexts(common.file_vector)
+    return fix_zeros(common.backwards_model.predict_batch(suffixes[contexts]))
+
+
 def chop_prefix(sequence, prefix=SENTENCE_LENGTH):
     return islice(sequence, prefix, len(sequence))
 
 
-def index_of_max(seq):
-    return max(enumerate(seq), key=lambda t: t[1])[0]
+def unsure_contexts(prefix_preds, actuals, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Returns the indices of the contexts where the forwards model would not
+    confidently have guessed the actual token.
+
+    >>> prefix_preds = np.array([[0.95, 0.05], [0.75, 0.25], [0.5, 0.5]])
+    >>> unsure_contexts(prefix_preds, np.array([0, 0, 1])).tolist()
+    [1, 2]
+    """
+    rows = np.arange(len(actuals))
+    guessed = prefix_preds.argmax(axis=1) == actuals
+    confident = prefix_preds[rows, actuals] >= threshold
+    return np.flatnonzero(~(guessed & confident))
+
+
+def score_contexts(prefix_preds, suffix_preds):
+    """
+    Scores every context at once: the consensus of both models, how much
+    they agree (the peak of the consensus), and each model's best guess.
+
+    >>> scores = score_contexts(np.array([[0.25, 0.75], [0.5, 0.5]]),
+    ...                         np.array([[0.25, 0.75], [0.75, 0.25]]))
+    >>> scores.agreements.tolist()
+    [0.75, 0.6]
+    >>> scores.forwards_predictions.tolist()
+    [1, 0]
+    >>> scores.backwards_predictions.tolist()
+    [1, 0]
+    """
+    means = consensus(prefix_preds, suffix_preds)
+    return Scores(means=means,
+                  agreements=means.max(axis=1),
+                  forwards_predictions=prefix_preds.argmax(axis=1),
+                  backwards_predictions=suffix_preds.argmax(axis=1))
+
+
+def least_agreements(agreements, k):
+    """
+    Returns the k contexts on which the models agree the least, least first.
+    Tied contexts are chosen and listed by index, as if every agreement had
+    been sorted.
+
+    >>> agreements = np.array([0.75, 0.25, 0.5, 0.125])
+    >>> [a.index for a in least_agreements(agreements, 2)]
+    [3, 1]
+    >>> agreements = np.array([0.5] * 3 + [0.125] * 10 + [0.875] * 5)
+    >>> [a.index for a in least_agreements(agreements, 3)]
+    [3, 4, 5]
+    """
+    k = min(k, len(agreements))
+    if k == 0:
+        return []
+
+    # The k-th lowest agreement.
+    kth = np.partition(agreements, k - 1)[k - 1]
+    below = agreements < kth
+    tied = agreements == kth
+    # Fill the places left over with the tied contexts of the lowest indices.
+    n_left = k - below.sum()
+    indices = np.flatnonzero(below | (tied & (np.cumsum(tied) <= n_left)))
+    return sorted(Agreement(agreements[i], int(i)) for i in indices)
 
 def tokens_to_source_code(tokens):
     return ' '.join(token.value for token in tokens)
@@ -322,9 +647,13 @@ class Fixes:
         self.tokens = tokens
         self.offset = offset
         self.fixes = []
+        # Edits that have already been syntax checked.
+        self._tried = set()
 
     def try_remove(self, index):
         pos = index + self.offset
+        if not self._first_try('remove', pos):
+            return
         suggestion = self.tokens[:pos] + self.tokens[pos + 1:]
         if check_syntax(tokens_to_source_code(suggestion)):
             self.fixes.append(Remove(pos, self.tokens))
@@ -332,10 +661,18 @@ class Fixes:
     def try_insert(self, index, new_token):
         assert isinstance(new_token, Token)
         pos = index + self.offset
+        if not self._first_try('insert', pos, new_token.value):
+            return
         suggestion = self.tokens[:pos] + [new_token] + self.tokens[pos:]
         if check_syntax(tokens_to_source_code(suggestion)):
             self.fixes.append(Insert(new_token, pos, self.tokens))
 
+    def _first_try(self, *edit):
+        if edit in self._tried:
+            return False
+        self._tried.add(edit)
+        return True
+
     def __bool__(self):
         return len(self.fixes) > 0
 
@@ -351,8 +688,14 @@ def id_to_token(token_id):
     >>> token.value
     'function'
     """
-    with synthetic_file(vocabulary.to_text(token_id)) as file_obj:
-        return tokenize_file(file_obj)[0]
+    token_id = int(token_id)
+    try:
+        return _ID2TOKEN[token_id]
+    except KeyError:
+        pass
+
+    token = _ID2TOKEN[token_id] = tokenize_source(ID2TEXT[token_id])[0]
+    return token
 
 
 def suggest(**kwargs):
@@ -361,47 +704,29 @@ def suggest(**kwargs):
         print("No need to fix: Already syntactically correct!")
         return
 
-    least_agreements = []
-    forwards_predictions = []
-    backwards_predictions = []
-
-    sent_forwards = Sentences(common.file_vector,
-                              size=SENTENCE_LENGTH,
-                              backwards=False)
-    sent_backwards = Sentences(common.file_vector,
-                               size=SENTENCE_LENGTH,
-                               backwards=True)
-
     # Predict every context.
-    contexts = enumerate(zip(chop_prefix(common.tokens, PREFIX_LENGTH),
-                             sent_forwards, chop_prefix(sent_backwards)))
+    _, _, actuals = split_contexts(common.file_vector)
+    prefix_preds = predict_prefixes(common)
 
-    # Find disagreements.
-    for index, (token, (prefix, x1), (suffix, x2)) in contexts:
-        prefix_pred = common.forwards_model.predict(prefix)
-        suffix_pred = common.backwards_model.predict(suffix)
-
-        # Get its harmonic mean
-        mean = consensus(prefix_pred, suffix_pred)
-        forwards_predictions.append(index_of_max(prefix_pred))
-        backwards_predictions.append(index_of_max(suffix_pred))
-        paired_rankings = rank(mean)
-        min_token_id, min_prob = paired_rankings[0]
-        least_agreements.append(Agreement(min_prob, index))
+    # Only ask the backwards model about the contexts that the forwards model
+    # is unsure of; the rest agree with the file, so they are not the error.
+    unsure = unsure_contexts(prefix_preds, actuals)
+    suffix_preds = predict_suffixes(common, unsure)
+    scores = score_contexts(prefix_preds[unsure], suffix_preds)
 
     fixes = Fixes(common.tokens)
 
     # For the top disagreements, synthesize fixes.
-    least_agreements.sort()
-    for disagreement in least_agreements[:3]:
-        pos = disagreement.index
+    for disagreement in least_agreements(scores.agreements, 3):
+        i = disagreement.index
+        pos = int(unsure[i])
 
         # Assume an addition. Let's try removing some tokens.
         fixes.try_remove(pos)
 
         # Assume a deletion. Let's try inserting some tokens.
-        fixes.try_insert(pos, id_to_token(forwards_predictions[pos]))
-        fixes.try_insert(pos, id_to_token(backwards_predictions[pos]))
+        fixes.try_insert(pos, id_to_token(scores.forwards_predictions[i]))
+        fixes.try_insert(pos, id_to_token(scores.backwards_predictions[i]))
 
     if not fixes:
         t = Terminal()
@@ -409,16 +734,32 @@ def suggest(**kwargs):
         return -1
 
     t = Terminal()
+    lines = []
     for fix in fixes:
         header = t.bold("{filename}:{line}:{column}:".format(
             filename=common.filename, line=fix.line, column=1 + fix.column
         ))
-        print(header, fix)
+        lines.append(' '.join((header, str(fix))))
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 def harmonic_mean(a, b):
     return 2 * (a * b) / (a + b)
 
 
+def fix_zeros(predictions):
+    """
+    Replaces probabilities that underflowed to exactly zero with the
+    smallest positive float, so that the harmonic mean never divides zero
+    by zero. Every other probability is left as it is.
+
+    >>> fixed = fix_zeros(np.array([0.0, 1e-9, 0.75]))
+    >>> fixed.tolist() == [np.finfo(float).tiny, 1e-9, 0.75]
+    True
+    """
+    epsilon = np.finfo(predictions.dtype).tiny
+    return np.where(predictions == 0, epsilon, predictions)
+
+
 #consensus = operator.mul
 consensus = harmonic_mean
 
@@ -430,86 +771,62 @@ def dump(**kwargs):
     ranking_line = "   {prob:6.2f}% → {color}{text}{t.normal}"
     actual_line = "{t.red}Actual{t.normal}: {t.bold}{actual_text}{t.normal}"
 
-    sent_forwards = Sentences(common.file_vector,
-                              size=SENTENCE_LENGTH,
-                              backwards=False)
-    sent_backwards = Sentences(common.file_vector,
-                               size=SENTENCE_LENGTH,
-                               backwards=True)
+    prefixes, suffixes, actuals = split_contexts(common.file_vector)
+    if len(actuals) == 0:
+        print(t.red("Could not analyze file!"), file=sys.stderr)
+        return
+
+    scores = score_contexts(predict_prefixes(common),
+                            predict_suffixes(common))
+    means = scores.means
+    ranks = rank_of(actuals, means)
 
-    least_agreement = []
-    forwards_predictions = []
-    backwards_predictions = []
-    ranks = []
+    all_top_5_words = top_k_rows(means, 5)
 
+    lines = []
     contexts = enumerate(zip(chop_prefix(common.tokens, PREFIX_LENGTH),
-                             sent_forwards, chop_prefix(sent_backwards)))
+                             prefixes, suffixes, actuals, means,
+                             all_top_5_words))
 
     # Note, the index is offset from the true start; i.e., when
     # index == 0, the true index is SENTENCE_LENGTH
-    for index, (token, (prefix, x1), (suffix, x2)) in contexts:
-        assert x1 == x2
-        actual = x1
-        print(unvocabularize(prefix[-5:]),
-              t.bold_underline(token.value),
-              unvocabularize(suffix[:5]))
-
-        prefix_pred = common.forwards_model.predict(prefix)
-        suffix_pred = common.backwards_model.predict(suffix)
-
-        # harmonic mean
-        mean = consensus(suffix_pred, prefix_pred)
+    for index, (token, prefix, suffix, actual, mean, top_5_words) in contexts:
+        lines.append(' '.join((unvocabularize(prefix[-5:]),
+                               t.bold_underline(token.value),
+                               unvocabularize(suffix[:5]))))
 
-        forwards_predictions.append(index_of_max(prefix_pred))
-        backwards_predictions.append(index_of_max(suffix_pred))
-
-        paired_rankings = rank(mean)
-        ranked_vocab = list(tuple(zip(*paired_rankings))[0])
-        top_5 = paired_rankings[:5]
-        top_5_words = ranked_vocab[:5]
-
-        for token_id, weight in top_5:
+        for token_id in top_5_words:
             color = t.green if token_id == actual else ''
-            text = vocabulary.to_text(token_id)
-            prob = weight * 100.0
-            print(ranking_line.format_map(locals()))
-
-        ranks.append(ranked_vocab.index(actual) + 1)
-        min_token_id, min_prob = paired_rankings[0]
-        least_agreement.append(Agreement(min_prob, index))
+            text = ID2TEXT[token_id]
+            prob = mean[token_id] * 100.0
+            lines.append(ranking_line.format_map(locals()))
 
         if actual not in top_5_words:
-            actual_text = vocabulary.to_text(actual)
-            print(actual_line.format_map(locals()))
-
-        print()
+            actual_text = ID2TEXT[actual]
+            lines.append(actual_line.format_map(locals()))
 
-        if not ranks:
-            print(t.red("Could not analyze file!"), file=sys.stderr)
-            return
+        lines.append('')
 
-    print("MRR: ", mean_reciprocal_rank(ranks))
-    print("Lowest rank:", max(ranks))
-    print("Time at #1: {:.2f}%".format(
-          100 * sum(1 for rank in ranks if rank == 1) / len(ranks)))
-    print()
+    lines.extend(summarize_ranks(ranks))
+    lines.append('')
 
-    forwards_text = [vocabulary.to_text(num) for num in forwards_predictions]
-    backwards_text = [vocabulary.to_text(num) for num in backwards_predictions]
+    forwards_text = [ID2TEXT[num] for num in scores.forwards_predictions]
+    backwards_text = [ID2TEXT[num] for num in scores.backwards_predictions]
 
-    least_agreement.sort()
     # Compensate for offset indices
-    file_vector = common.file_vector[SENTENCE_LENGTH:]
     tokens_text = [tok.value for tok in common.tokens[PREFIX_LENGTH:]]
-    for disagreement in least_agreement[:5]:
-        print(disagreement.probability)
+    for disagreement in least_agreements(scores.agreements, 5):
+        lines.append(str(disagreement.probability))
         prefix = ' '.join(disagreement.prefix(tokens_text))
         suffix = ' '.join(disagreement.suffix(tokens_text))
 
-        print("   ", prefix, t.yellow(forwards_text @ disagreement), suffix)
-        print("   ", prefix, t.underline(tokens_text @ disagreement), suffix)
-        print("   ", prefix, t.blue(backwards_text @ disagreement), suffix)
-        print()
+        for text in (t.yellow(forwards_text @ disagreement),
+                     t.underline(tokens_text @ disagreement),
+                     t.blue(backwards_text @ disagreement)):
+            lines.append(' '.join(('   ', prefix, text, suffix)))
+        lines.append('')
+
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 def print_top_5(model, file_vector, tokens):
@@ -518,46 +835,54 @@ def print_top_5(model, file_vector, tokens):
     ranking_line = "   {prob:6.2f}% → {color}{text}{t.normal}"
     actual_line = "{t.red}Actual{t.normal}: {t.bold}{actual_text}{t.normal}"
 
-    ranks = []
-    sentences = Sentences(file_vector, size=SENTENCE_LENGTH,
-                          backwards=model.backwards)
+    sentences, actuals = model.sentences(file_vector)
+    if len(actuals) == 0:
+        print(t.red("Could not analyze file!"), file=sys.stderr)
+        return
+
+    all_predictions = model.predict_file(file_vector)
+    all_top_5_words = top_k_rows(all_predictions, 5)
+    ranks = rank_of(actuals, all_predictions)
 
     start = PREFIX_LENGTH if model.forwards else -1
 
-    for i, (sentence, actual) in enumerate(sentences, start=start):
+    lines = []
+    contexts = enumerate(zip(sentences, actuals, all_predictions,
+                             all_top_5_words), start=start)
+    for i, (sentence, actual, predictions, top_5_words) in contexts:
         token = tokens[i] if 0 <= i < len(tokens) else '/*boundary*/'
-        predictions = model.predict(sentence)
-        paired_rankings = rank(predictions)
-        ranked_vocab = list(tuple(zip(*paired_rankings))[0])
-        top_5 = paired_rankings[:5]
-        top_5_words = ranked_vocab[:5]
 
         sentence_text = unvocabularize(sentence[:10])
-        print(header.format_map(locals()))
+        lines.append(header.format_map(locals()))
 
-        for token_id, weight in top_5:
+        for token_id in top_5_words:
             color = t.green if token_id == actual else ''
-            text = vocabulary.to_text(token_id)
-            prob = weight * 100.0
-            print(ranking_line.format_map(locals()))
+            text = ID2TEXT[token_id]
+            prob = predictions[token_id] * 100.0
+            lines.append(ranking_line.format_map(locals()))
 
         if actual not in top_5_words:
-            actual_text = vocabulary.to_text(actual)
-            print(actual_line.format_map(locals()))
+            actual_text = ID2TEXT[actual]
+            lines.append(actual_line.format_map(locals()))
 
-        ranks.append(ranked_vocab.index(actual) + 1)
+        lines.append('')
 
-        print()
+    lines.extend(summarize_ranks(ranks))
+    sys.stdout.write('\n'.join(lines) + '\n')
 
-    if not ranks:
-        print(t.red("Could not analyze file!"), file=sys.stderr)
-        return
 
-    print("MRR: ", mean_reciprocal_rank(ranks))
-    print("Lowest rank:", max(ranks))
-    print("Time at #1: {:.2f}%".format(
-        100 * sum(1 for rank in ranks if rank == 1) / len(ranks)
-    ))
+def summarize_ranks(ranks):
+    """
+    Returns the lines that summarize how well the actual tokens ranked.
+
+    >>> summarize_ranks(np.array([1, 2, 1, 4]))
+    ['MRR:  0.6875', 'Lowest rank: 4', 'Time at #1: 50.00%']
+    """
+    return [
+        "MRR:  {}".format(mean_reciprocal_rank(ranks)),
+        "Lowest rank: {}".format(ranks.max()),
+        "Time at #1: {:.2f}%".format(100 * (ranks == 1).mean()),
+    ]
 
 
 def add_common_args(parser):
@@ -570,6 +895,10 @@ def add_common_args(parser):
     parser.add_argument('--weights-backwards', type=Path,
                         default=THIS_DIRECTORY /
                         'javascript-tiny.backwards.5.h5')
+    parser.add_argument('--onnx-forwards', type=Path, default=None,
+                        help='run this ONNX export of the forwards model')
+    parser.add_argument('--onnx-backwards', type=Path, default=None,
+                        help='run this ONNX export of the backwards model')
 
 
 parser = argparse.ArgumentParser()
@@ -22,16 +22,21 @@ const esprima = require('esprima');
 
 module.exports.tokenize = tokenize;
 module.exports.checkSyntax = checkSyntax;
+module.exports.serve = serve;
 
 
 if (require.main === module) {
-  const source = fs.readFileSync('/dev/stdin', 'utf8');
-  const shouldCheckSyntax =
-    process.argv.slice(2).indexOf('--check-syntax') >= 0;
-  if (shouldCheckSyntax) {
-    process.exit(checkSyntax(source) ? 0 : 1);
+  const args = process.argv.slice(2);
+  if (args.indexOf('--server') >= 0) {
+    serve(process.stdin, process.stdout);
   } else {
-    console.log(JSON.stringify(tokenize(source)));
+    const source = fs.readFileSync('/dev/stdin', 'utf8');
+    const shouldCheckSyntax = args.indexOf('--check-syntax') >= 0;
+    if (shouldCheckSyntax) {
+      process.exit(checkSyntax(source) ? 0 : 1);
+    } else {
+      console.log(JSON.stringify(tokenize(source)));
+    }
   }
 }
 
@@ -63,6 +68,46 @@ function checkSyntax(source) {
   }
 }
 
+/**
+ * Tokenizes or syntax checks many sources over one pair of streams, so
+ * that callers only pay for starting Node once.
+ *
+ * Each request is a line with the command ("tokenize" or "check") and the
+ * length of the source in bytes, followed by the UTF-8 source. Each
+ * response is the length in bytes of the JSON result on its own line,
+ * followed by the JSON: the token list, or whether the syntax is valid.
+ */
+function serve(input, output) {
+  let buffer = Buffer.alloc(0);
+
+  input.on('data', chunk => {
+    buffer = Buffer.concat([buffer, chunk]);
+
+    for (;;) {
+      const newline = buffer.indexOf('\n');
+      if (newline < 0) {
+        break;
+      }
+
+      const [command, length] =
+        buffer.toString('ascii', 0, newline).split(' ');
+      const end = newline + 1 + parseInt(length, 10);
+      if (buffer.length < end) {
+        break;
+      }
+
+      const source = buffer.toString('utf8', newline + 1, end);
+      buffer = buffer.slice(end);
+
+      const result =
+        command === 'check' ? checkSyntax(source) : tokenize(source);
+      const response = Buffer.from(JSON.stringify(result), 'utf8');
+      const header = Buffer.from(`${response.length}\n`, 'ascii');
+      output.write(Buffer.concat([header, response]));
+    }
+  });
+}
+
 /**
  * Remove the shebang line, if there is one.
  */
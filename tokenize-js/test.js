@@ -14,9 +14,11 @@
  * limitations under the License.
  */
 
+import {PassThrough} from 'stream';
+
 import test from 'ava';
 
-import {tokenize, checkSyntax} from './';
+import {tokenize, checkSyntax, serve} from './';
 
 test('it tokenizes a trivial script', t => {
   const tokens = tokenize('$');
@@ -66,3 +68,32 @@ test('it can syntax check', t => {
   t.true(checkSyntax('function fun() { }'));
   t.false(checkSyntax('function fun() };'));
 });
+
+test.cb('it serves length-prefixed requests', t => {
+  const input = new PassThrough();
+  const output = new PassThrough();
+  serve(input, output);
+
+  output.once('readable', () => {
+    const response = output.read().toString('utf8');
+    const [length, json] = response.split('\n');
+    t.is(Buffer.byteLength(json), Number(length));
+    t.is(5, JSON.parse(json).length);
+    t.end();
+  });
+
+  input.write('tokenize 11\n$("hello");');
+});
+
+test.cb('it serves syntax checks', t => {
+  const input = new PassThrough();
+  const output = new PassThrough();
+  serve(input, output);
+
+  output.once('readable', () => {
+    t.is('5\nfalse', output.read().toString('utf8'));
+    t.end();
+  });
+
+  input.write('check 17\nfunction fun() };');
+});
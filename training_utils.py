@@ -22,6 +22,7 @@ TODO: rename this file!
 from itertools import islice
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from more_itertools import chunked
 from path import Path
 
@@ -72,7 +73,7 @@ class Sentences:
         n_sentences = len(self)
 
         if n_sentences <= 0:
-            raise StopIteration
+            return
 
 
         sentence_len = self.size
@@ -89,12 +90,11 @@ class Sentences:
                 sentence = token_vector[start + 1:end + 1]
                 return sentence, token_vector[start]
 
-        # Fill in the vectors.
+        # Fill in the vectors. Since n_sentences == len(vector) - size, the
+        # last end is always a valid index.
         for sentence_id in range(n_sentences):
             start = sentence_id
             end = sentence_id + sentence_len
-            assert end < len(token_vector), "not: %d < %d" %(end,
-                                                        len(token_vector))
             yield make_sample(start, end)
 
     def __len__(self):
@@ -105,6 +105,23 @@ class Sentences:
         return at_least(0, sentences_possible)
 
 
+def sliding_windows(vector, size):
+    """
+    Returns every window of the given size in the vector, one per row, as a
+    view on the vector's memory (nothing is copied).
+
+    >>> sliding_windows(np.arange(5), 3).tolist()
+    [[0, 1, 2], [1, 2, 3], [2, 3, 4]]
+    >>> sliding_windows(np.arange(2), 3).shape
+    (0, 3)
+    """
+    vector = np.ascontiguousarray(vector)
+    n_windows = at_least(0, len(vector) - size + 1)
+    stride, = vector.strides
+    return as_strided(vector, shape=(n_windows, size),
+                      strides=(stride, stride))
+
+
 def one_hot_batch(batch, *, batch_size=None, sentence_length=None,
                   vocab_size=len(vocabulary), np=np):
     """
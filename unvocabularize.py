@@ -35,6 +35,9 @@ e.g.,
 
 from vocabulary import vocabulary
 
+# The text of every token id.
+ID2TEXT = [vocabulary.to_text(i) for i in range(len(vocabulary))]
+
 
 def unvocabularize(vector):
     """
@@ -42,7 +45,7 @@ def unvocabularize(vector):
     '/*<start>*/ var $anyIdentifier ; /*<end>*/'
     """
 
-    return ' '.join(vocabulary.to_text(element) for element in vector)
+    return ' '.join(ID2TEXT[element] for element in vector)
 
 
 if __name__ == '__main__':
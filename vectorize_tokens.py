@@ -27,8 +27,12 @@ def vectorize_tokens(tokens):
     Automatically inserts start and end tokens.
 
     >>> from corpus import Token
-    >>> vectorize_tokens([Token(value='var', type='Keyword', loc=None)])
-    (0, 86, 99)
+    >>> token = Token(value='var', type='Keyword', loc=None)
+    >>> vector = vectorize_tokens([token])
+    >>> vector.tolist()
+    [0, 86, 99]
+    >>> vector.dtype
+    dtype('int32')
     """
     def generate():
         yield vocabulary.to_index(START_TOKEN)
@@ -36,7 +40,7 @@ def vectorize_tokens(tokens):
             yield vocabulary.to_index(stringify_token(token))
         yield vocabulary.to_index(END_TOKEN)
 
-    return tuple(generate())
+    return np.fromiter(generate(), dtype=np.int32)
 
 
 def create_one_hot_vector(index):